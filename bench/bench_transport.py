@@ -0,0 +1,71 @@
+"""
+Compares transports on the same local WSGI application.
+
+usage:
+PYTHONPATH=. python bench/bench_transport.py [deals_count] [rounds]
+"""
+import json
+import threading
+import time
+import sys
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import requests
+
+from rest_client import base, transport
+
+
+def deals_app(count):
+    deals = {'/v1/deals': [{'id': str(i)} for i in xrange(count)]}
+    for i in xrange(count):
+        deals['/v1/deals/{}'.format(i)] = {'id': str(i),
+                                           'title': 'deal {}'.format(i)}
+
+    def app(environ, start_response):
+        path = environ['PATH_INFO']
+        if path not in deals:
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return ['not found']
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [json.dumps(deals[path])]
+    return app
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def bench(client, rounds):
+    requests_count = 0
+    start = time.time()
+    for _ in xrange(rounds):
+        requests_count += len(client.deals.get()) + 1
+    return requests_count, time.time() - start
+
+
+def main(count=50, rounds=10):
+    base.log.setLevel('WARNING')
+    app = deals_app(count)
+    server = make_server('127.0.0.1', 0, app, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = '127.0.0.1:{}/v1'.format(server.server_port)
+
+    transports = [
+        ('wsgi', transport.WSGITransport(app)),
+        ('requests', transport.RequestsTransport()),
+        ('session', transport.RequestsTransport(requests.Session())),
+    ]
+    for name, backend in transports:
+        requests_count, seconds = bench(base.Client(url, transport=backend),
+                                        rounds)
+        backend.close()
+        print '{:<10} {:>6} requests {:.3f}s {:.1f} req/s'.format(
+            name, requests_count, seconds, requests_count / seconds)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
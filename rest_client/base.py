@@ -1,12 +1,20 @@
+import csv
 import functools
+import gzip
 import json
 import logging
 import urllib2
 import pprint
+import threading
+import time
+import Queue
+from cStringIO import StringIO
+from multiprocessing.pool import ThreadPool
 
 import jsonschema
 import requests
 
+import transport as transports
 from pprint import pprint as pp
 logging.basicConfig(level=logging.DEBUG)
 log = logging.getLogger(__name__)
@@ -19,6 +27,8 @@ requests_log.setLevel(logging.WARNING)
 _identifier = 'id'
 _resource_list_slash = False
 _resource_slash = False
+# default (connect, read) timeout in seconds for every request
+_timeout = (10, 60)
 
 
 def empty_callable(*args, **kwargs):
@@ -64,6 +74,10 @@ class FilterError(BaseRestError):
     pass
 
 
+class DeadlineExceeded(BaseRestError):
+    pass
+
+
 class Base():
     """
     Get resource list by name MixIn
@@ -104,22 +118,63 @@ class Resource(BaseRequest, object):
     >>>client = Client("localhost")
     >>>foo = client.resources.post(name='foo')
     >>>foo.put(name='bar')
+    >>>foo['name'] = 'baz'
+    >>>foo.save()
     >>>spam = foo.nested_resources.post('SPAM')
     """
     RESOURCE = None
     IDENTIFIER = _identifier
     SCHEMA = None
+    _batch = None
 
     def __init__(self, client, resource, path, kwargs):
         self._resource_name = resource
         super(Resource, self).__init__(client, path)
         self._kwargs = kwargs
+        self._dirty = set()
 
     def _update(self, kwargs):
         """
-        Internal update for resource attributes
+        Internal update for resource attributes,
+        resets changes tracking
         """
         self._kwargs.update(kwargs)
+        self._dirty.clear()
+
+    def changes(self):
+        """
+        @return: dict of attributes set with item assignment
+        since last sync with server
+        """
+        return {k: self._kwargs[k] for k in self._dirty}
+
+    def save(self):
+        """
+        Sends only changed attributes with PATCH.
+        Does nothing if there are no changes, or inside of batch,
+        that sends them on exit.
+        """
+        changes = self.changes()
+        if not changes or self._batch:
+            return
+        response = self._request('patch', body=changes)
+        try:
+            kwargs = response.json()
+        except ValueError:
+            kwargs = {}
+        self._update(kwargs if isinstance(kwargs, dict) else {})
+
+    def batch(self):
+        """
+        Context that saves all changes made inside it with one request,
+        save calls inside of it are postponed till exit
+
+        usage:
+        >>>with deal.batch():
+        ...    deal['title'] = 'New title'
+        ...    deal['agent'] = '007'
+        """
+        return Batch(self)
 
     def delete(self):
         """
@@ -134,20 +189,28 @@ class Resource(BaseRequest, object):
         kwargs = self._request().json()
         self._update(kwargs)
 
+    def _body(self, kwargs):
+        """
+        @return: not saved changes updated with @kwargs
+        """
+        body = self.changes()
+        body.update(kwargs)
+        return body
+
     def post(self, **kwargs):
         """
-        Updates resources attributes
+        Updates resources attributes, sends not saved changes too
         @params kwargs: attributes to update
         """
-        self._request('post', body=kwargs)
+        self._request('post', body=self._body(kwargs))
         self.get()
 
     def put(self, **kwargs):
         """
-        Updates resource.
+        Updates resource, sends not saved changes too
         @params kwargs: attributes to update
         """
-        self._request('put', body=kwargs)
+        self._request('put', body=self._body(kwargs))
         self.get()
 
     def __getitem__(self, item):
@@ -158,6 +221,13 @@ class Resource(BaseRequest, object):
             return self._kwargs[item]
         raise KeyError(item)
 
+    def __setitem__(self, item, value):
+        """
+        Local attribute update, use save to send it
+        """
+        self._kwargs[item] = value
+        self._dirty.add(item)
+
     def __str__(self):
         """
         Better string representation
@@ -179,6 +249,8 @@ class ResourceList(BaseRequest, list):
     """
 
     RESOURCE = None
+    # get every resource in _get, not only list attributes
+    _hydrate = True
 
     def __init__(self, client, resource, path):
         super(ResourceList, self).__init__(
@@ -209,7 +281,7 @@ class ResourceList(BaseRequest, list):
             where = {}
 
         def resources():
-            upd = True
+            upd = self._hydrate
             for kwargs in response:
                 path = '/'.join([self._path, str(kwargs[self._id])])
                 resource = self._resource(path, kwargs)
@@ -221,14 +293,30 @@ class ResourceList(BaseRequest, list):
                 yield resource
 
         for resource in resources():
-            try:
-                if all(resource[k] == v for k, v in where.items()):
-                    yield resource
-            except KeyError as e:
-                raise FilterError(
-                    '''Resource "{}" doesn't have "{}" field'''.
-                    format(self._resource_name, e.message)
-                )
+            if self._match(resource, where):
+                yield resource
+
+    def _match(self, resource, where):
+        """
+        @return True if resource matches @where dict
+        @raise FilterError if fields from @where are not found in resource"""
+        try:
+            return all(resource[k] == v for k, v in where.items())
+        except KeyError as e:
+            raise FilterError(
+                '''Resource "{}" doesn't have "{}" field'''.
+                format(self._resource_name, e.message)
+            )
+
+    def _list(self, query=None):
+        """
+        @return list of resources with list attributes only
+        """
+        hydrate, self._hydrate = self._hydrate, False
+        try:
+            return list(self._get(None, query))
+        finally:
+            self._hydrate = hydrate
 
     def _resource(self, path, kwargs):
         return self._resource_cls(self._client,
@@ -254,6 +342,176 @@ class ResourceList(BaseRequest, list):
         """
         return next(self._get(where, query), None)
 
+    def walk(self, children, depth=1, where=None, query=None,
+             workers=8, visited=None):
+        """
+        Crawl nested resource lists in parallel
+        @param children: list of nested resource list names to follow,
+        lists that can not be requested for some resource are skipped
+        @param depth: how many levels of nesting to follow
+        @param where: optional dict param to filter top level resources
+        @param query: optional dict of queries for top level request
+        @param workers: number of threads fetching resources and lists
+        @param visited: optional set of paths of already yielded resources.
+        It is updated in place after consumer gets back from each resource,
+        so it can be stored as checkpoint and passed again to resume crawling.
+        Resumed crawl still goes through visited resources to reach their
+        nested lists, but yields and gets only new resources.
+        @return generator of resources, as soon as they are fetched
+
+        usage:
+        >>>done = set()
+        >>>for resource in client.deals.walk(['items'], depth=2, visited=done):
+        ...    save(resource)
+        """
+        if visited is None:
+            visited = set()
+        if not where:
+            where = {}
+        results = Queue.Queue()
+
+        def hydrate(resource, level):
+            if resource._path not in visited or (where and not level):
+                try:
+                    resource.get()
+                except HttpError:
+                    pass
+            return resource
+
+        def expand(resource, level):
+            found = []
+            for child in children:
+                try:
+                    found.extend(getattr(resource, child)._list())
+                except HttpError:
+                    pass
+            return found
+
+        def run(func, resource, level):
+            self._client._local.deadline = deadline
+            try:
+                results.put((func, resource, level, func(resource, level)))
+            except Exception as e:
+                results.put((None, resource, level, e))
+
+        deadline = self._client._deadline
+        pool = ThreadPool(workers)
+        seen = set()
+        pending = 0
+        try:
+            for resource in self._list(query):
+                seen.add(resource._path)
+                pool.apply_async(run, (hydrate, resource, 0))
+                pending += 1
+
+            while pending:
+                func, resource, level, result = results.get()
+                pending -= 1
+                if func is None:
+                    raise result
+
+                if func is expand:
+                    for child in result:
+                        if child._path not in seen:
+                            seen.add(child._path)
+                            pool.apply_async(run, (hydrate, child, level + 1))
+                            pending += 1
+                    continue
+
+                if not level and not self._match(resource, where):
+                    continue
+                if level < depth:
+                    pool.apply_async(run, (expand, resource, level))
+                    pending += 1
+                if resource._path not in visited:
+                    yield resource
+                    visited.add(resource._path)
+        finally:
+            pool.terminate()
+
+    def export(self, path_or_file, format='jsonl', hydrate=True, where=None,
+               query=None, compress=False, fields=None, buffer_size=1000):
+        """
+        Stream resources to file, without keeping them in memory
+        @param path_or_file: file path or file-like object opened for writing
+        @param format: 'jsonl' or 'csv'
+        @param hydrate: get every resource, not only list attributes
+        @param where: optional dict param to filter response
+        @param query: optional dict of queries to be send with request
+        @param compress: gzip output, always on for paths ending with .gz
+        @param fields: csv columns, keys of the first resource by default
+        @param buffer_size: number of resources written at once
+        @return: dict with exported count, bytes written, seconds and rate
+
+        usage:
+        >>>client.deals.export('deals.jsonl.gz', hydrate=False)
+        {'count': 1000000, 'bytes': 52000000, 'seconds': 310.2, 'rate': 3223.7}
+        """
+        if format not in ('jsonl', 'csv'):
+            raise ValueError('Unknown export format "{}"'.format(format))
+
+        if isinstance(path_or_file, basestring):
+            compress = compress or path_or_file.endswith('.gz')
+            target = open(path_or_file, 'wb')
+        else:
+            target = path_or_file
+        counter = CountingFile(target)
+        out = gzip.GzipFile(fileobj=counter, mode='wb') \
+            if compress else counter
+
+        buf = StringIO()
+        writer = None
+        dropped = set()
+        stats = {'count': 0}
+        start = time.time()
+
+        def flush():
+            out.write(buf.getvalue())
+            buf.seek(0)
+            buf.truncate()
+
+        initial, self._hydrate = self._hydrate, hydrate
+        try:
+            for resource in self._get(where, query):
+                if format == 'jsonl':
+                    buf.write(json.dumps(resource._kwargs))
+                    buf.write('\n')
+                else:
+                    row = {csv_value(k): csv_value(v)
+                           for k, v in resource._kwargs.iteritems()}
+                    if writer is None:
+                        columns = [csv_value(k)
+                                   for k in fields or sorted(row)]
+                        known = set(columns)
+                        writer = csv.DictWriter(buf, columns,
+                                                extrasaction='ignore')
+                        writer.writeheader()
+                    extra = set(row) - known - dropped
+                    if extra:
+                        log.warning('{} fields {} are not exported'.format(
+                            self._resource_name, ', '.join(sorted(extra))))
+                        dropped.update(extra)
+                    writer.writerow(row)
+                stats['count'] += 1
+                if stats['count'] % buffer_size == 0:
+                    flush()
+            flush()
+        finally:
+            self._hydrate = initial
+            if out is not counter:
+                out.close()
+            if target is not path_or_file:
+                target.close()
+
+        stats['bytes'] = counter.bytes
+        stats['seconds'] = time.time() - start
+        stats['rate'] = stats['count'] / stats['seconds'] \
+            if stats['seconds'] else 0.0
+        log.info('exported {count} {name} ({bytes} bytes) in {seconds:.2f}s, '
+                 '{rate:.1f} resources/s'.format(name=self._resource_name,
+                                                 **stats))
+        return stats
+
     def post(self, **kwargs):
         """
         Create new resource
@@ -278,6 +536,10 @@ class Client(Base):
     public methods, only holds resource fabrics
     @param auth: username/password tuple
     @param url: base API url
+    @param transport: transport.Transport object used to send requests,
+    transport.RequestsTransport by default
+    @param timeout: seconds or (connect, read) tuple for every request,
+    module _timeout by default
 
     usage:
     >>>client = Client(('admin', 'password'),'127.0.0.1')
@@ -288,20 +550,65 @@ class Client(Base):
 
     _headers = {}
 
-    def __init__(self, url, auth=None):
+    def __init__(self, url, auth=None, transport=None, timeout=None):
         args = iter(url.split('/', 1))
         base = next(args)
         path = next(args, None)
         self.url = 'http://{}'.format(base)
         self.auth = auth
+        self.transport = transport or transports.RequestsTransport()
+        self.timeout = timeout if timeout is not None else _timeout
         self._client = self
         self._path = '/'+path if path is not None else ''
+        self._local = threading.local()
+
+    @property
+    def _deadline(self):
+        """
+        Deadline of the current thread operation,
+        it is set in self._local by Deadline context
+        """
+        return getattr(self._local, 'deadline', None)
+
+    def deadline(self, seconds):
+        """
+        Limits time of all requests sent inside of context
+        by the current thread. Threads started by walk get
+        deadline of the thread that iterates it.
+        @param seconds: overall time budget
+        @raises DeadlineExceeded when budget is spent
+
+        usage:
+        >>>with client.deadline(10):
+        ...    deal = client.deals.first()
+        ...    items = deal.items.get()
+        """
+        return Deadline(self, seconds)
+
+    def _request_timeout(self):
+        """
+        @return: request timeout clipped to remaining deadline budget
+        @raises DeadlineExceeded if budget is spent
+        """
+        if self._deadline is None:
+            return self.timeout
+        remaining = self._deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded('Deadline exceeded')
+        if self.timeout is None:
+            return remaining
+        if isinstance(self.timeout, tuple):
+            return tuple(remaining if t is None else min(t, remaining)
+                         for t in self.timeout)
+        return min(self.timeout, remaining)
 
     def _request(self, method='get', **kwargs):
         """
         Request sender. Joins all chained resources in path.
         @raises HttpError is response is not ok
+        @raises DeadlineExceeded if deadline budget is spent
         """
+        timeout = self._request_timeout()
 
         query_path = ''
         query = kwargs.get('query', None)
@@ -321,20 +628,23 @@ class Client(Base):
             body = json.dumps(body)
 
         try:
-            response = requests.request(
+            response = self.transport.request(
                 method,
                 url,
                 auth=self.auth,
                 headers=headers,
-                data=body)
+                data=body,
+                timeout=timeout)
         except Exception as e:
+            if self._deadline is not None and self._deadline <= time.time():
+                raise DeadlineExceeded(e.message)
             raise HttpError(e.message)
         log.info('request : {} {} {}'.format(
             method.upper(),
             url,
             response.status_code))
         log.debug('request headers: {}'.format(headers))
-        log.debug('request body: {}'.format(response.request.body))
+        log.debug('request body: {}'.format(body))
         log.debug('response body: {}'.format(response.text))
         log.info('-'*18)
         if response.status_code not in range(200, 210):
@@ -343,6 +653,74 @@ class Client(Base):
         return response
 
 
+def csv_value(value):
+    """
+    @return: utf-8 encoded csv cell, nested values are dumped to json
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+class CountingFile(object):
+    """
+    Write-only file wrapper, that counts written bytes
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes = 0
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.bytes += len(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+
+class Deadline(object):
+    """
+    Sets client deadline of the current thread for the time of context.
+    Nested deadlines can only shorten outer one.
+    """
+    def __init__(self, client, seconds):
+        self.client = client
+        self.seconds = seconds
+
+    def __enter__(self):
+        self.initial = self.client._deadline
+        deadline = time.time() + self.seconds
+        if self.initial is not None:
+            deadline = min(deadline, self.initial)
+        self.client._local.deadline = deadline
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.client._local.deadline = self.initial
+
+
+class Batch(object):
+    """
+    Saves resource changes on exit, if no exception was raised
+    """
+    def __init__(self, resource):
+        self.resource = resource
+
+    def __enter__(self):
+        self.initial = self.resource._batch
+        self.resource._batch = self
+        return self.resource
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.resource._batch = self.initial
+        if exc_type is None:
+            self.resource.save()
+
+
 class Context():
     def __init__(self, obj,  **kwargs):
         self.obj = obj
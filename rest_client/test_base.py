@@ -1,4 +1,8 @@
+import base64
+import gzip
 import json
+import threading
+from StringIO import StringIO
 
 import requests
 import pytest
@@ -6,6 +10,7 @@ import httpretty
 
 import base
 import custom_resource
+import transport
 
 
 class VersionFactory(base.ResourceList):
@@ -346,6 +351,205 @@ class TestBase(object):
         # TODO: Write actual test
         pass
 
+    def test_walk(self, client):
+        resources = {r['title']: r for r in client.deals.walk(
+            ['items'], where={'title': 'Second Deal'})}
+        assert sorted(resources) == ['Second Deal', 'apples', 'oranges']
+        assert resources['oranges']['amount'] == \
+            self.service["second_deal_items_oranges"]['data']['amount']
+
+    def test_walk_resume(self, client):
+        visited = set(['/v1/deals/2222'])
+        resources = list(client.deals.walk(
+            ['items'], depth=2, where={'title': 'Second Deal'},
+            visited=visited))
+        assert sorted(r['title'] for r in resources) == ['apples', 'oranges']
+        assert visited == set(['/v1/deals/2222',
+                               '/v1/deals/2222/items/12345',
+                               '/v1/deals/2222/items/33333'])
+        resources = list(client.deals.walk(
+            ['items'], depth=2, where={'title': 'Second Deal'},
+            visited=visited))
+        assert resources == []
+
+    def test_deadline_exceeded(self, client):
+        with pytest.raises(base.DeadlineExceeded):
+            with client.deadline(0):
+                client.deals.first()
+        assert client.deals.first()['id'] == '1111'
+
+    def test_default_timeout(self, client):
+        assert client._request_timeout() == base._timeout
+        with client.deadline(5):
+            assert all(0 < t <= 5 for t in client._request_timeout())
+
+    def test_nested_deadline(self, client):
+        with client.deadline(60):
+            outer = client._deadline
+            with client.deadline(120):
+                assert client._deadline == outer
+                assert all(t <= 60 for t in client._request_timeout())
+            assert client._deadline == outer
+        assert client._deadline is None
+
+    def test_deadline_per_thread(self, client):
+        entered = threading.Event()
+        checked = threading.Event()
+        seen = []
+
+        def other():
+            seen.append(client._deadline)
+            with client.deadline(1):
+                entered.set()
+                checked.wait()
+
+        with client.deadline(60):
+            outer = client._deadline
+            thread = threading.Thread(target=other)
+            thread.start()
+            entered.wait()
+            assert client._deadline == outer
+            checked.set()
+            thread.join()
+            assert client._deadline == outer
+        assert seen == [None]
+
+    def test_save_sends_changes_only(self, client):
+        httpretty.register_uri(httpretty.PATCH,
+                               'http://random.random.org/v1/deals/1111',
+                               status=204)
+        deal = client.deals.first()
+        assert deal.changes() == {}
+        deal['agent'] = '008'
+        deal.save()
+        assert json.loads(httpretty.last_request().body) == {'agent': '008'}
+        assert deal.changes() == {}
+
+    def test_put_sends_changes(self, client):
+        bodies = []
+
+        def put(request, uri, headers):
+            bodies.append(json.loads(request.body))
+            return 204, headers, ''
+
+        httpretty.register_uri(httpretty.PUT,
+                               'http://random.random.org/v1/deals/1111',
+                               body=put)
+        deal = client.deals.first()
+        deal['agent'] = '008'
+        deal.put(title='Put Deal')
+        assert bodies == [{'agent': '008', 'title': 'Put Deal'}]
+        assert deal.changes() == {}
+
+    def test_batch_save(self, client):
+        httpretty.register_uri(httpretty.PATCH,
+                               'http://random.random.org/v1/deals/2222',
+                               body=json.dumps({'agent': '008'}),
+                               content_type="application/json")
+        deal = client.deals.first(where={'title': 'Second Deal'})
+        last_request = httpretty.last_request()
+        with deal.batch():
+            deal['title'] = 'Last Deal'
+            deal.save()
+            deal['agent'] = '008'
+            deal.save()
+            assert httpretty.last_request() is last_request
+        assert json.loads(httpretty.last_request().body) == \
+            {'title': 'Last Deal', 'agent': '008'}
+        assert deal['agent'] == '008'
+
+    def test_export_jsonl(self, client):
+        out = StringIO()
+        stats = client.deals.export(out)
+        lines = out.getvalue().splitlines()
+        assert stats['count'] == len(lines) == 2
+        assert json.loads(lines[0])['agent'] == \
+            self.service['test_deal']['data']['agent']
+
+    def test_export_csv_gzip(self, client):
+        out = StringIO()
+        stats = client.deals.export(out, format='csv', hydrate=False,
+                                    compress=True)
+        assert stats['bytes'] == len(out.getvalue())
+        out.seek(0)
+        lines = gzip.GzipFile(fileobj=out).read().splitlines()
+        assert lines == ['id,title', '1111,Test Deal', '2222,Second Deal']
+
+    def test_export_factory(self, client):
+        out = StringIO()
+        client.version.export(out)
+        assert json.loads(out.getvalue()) == self.service['version']['data']
+
+    def test_csv_value(self):
+        assert base.csv_value({'a': [1]}) == '{"a": [1]}'
+        assert base.csv_value(u'\xe9') == '\xc3\xa9'
+        assert base.csv_value(None) == ''
+
     def test_reimplemintation_default_resource(self, custom_client):
         deal = custom_client.v1.deals.first()
-        assert deal._kwargs == deal.data()
\ No newline at end of file
+        assert deal._kwargs == deal.data()
+
+
+def deals_app(environ, start_response):
+    deals = {
+        '/v1/deals': [{'id': '1', 'title': 'wsgi deal'}],
+        '/v1/deals/1': {'id': '1', 'title': 'wsgi deal', 'amount': '10'}
+    }
+    path = environ['PATH_INFO']
+    if path not in deals:
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return ['not found']
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [json.dumps(deals[path])]
+
+
+class TestTransport(object):
+
+    @pytest.fixture
+    def client(self):
+        return base.Client('wsgi.local/v1',
+                           transport=transport.WSGITransport(deals_app))
+
+    def test_wsgi_transport(self, client):
+        deal = client.deals.first()
+        assert deal['amount'] == '10'
+
+    def test_wsgi_transport_error(self, client):
+        with pytest.raises(base.HttpError):
+            client.agents.get()
+
+    def test_walk_deadline(self):
+        timeouts = []
+
+        class Recording(transport.WSGITransport):
+            def request(self, *args, **kwargs):
+                timeouts.append(kwargs['timeout'])
+                return super(Recording, self).request(*args, **kwargs)
+
+        client = base.Client('wsgi.local/v1',
+                             transport=Recording(deals_app))
+        with client.deadline(30):
+            list(client.deals.walk(['items']))
+        assert len(timeouts) == 3
+        assert all(t <= 30 for timeout in timeouts for t in timeout)
+
+    def test_export_csv_unicode_fields(self):
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'application/json')])
+            return [json.dumps([{'id': '1', u'n\xe4me': u'\xe9'}])]
+        client = base.Client('wsgi.local',
+                             transport=transport.WSGITransport(app))
+        out = StringIO()
+        client.deals.export(out, format='csv', hydrate=False)
+        assert out.getvalue().splitlines() == \
+            ['id,n\xc3\xa4me', '1,\xc3\xa9']
+
+    def test_wsgi_transport_auth(self):
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'application/json')])
+            return [json.dumps([{'auth': environ['HTTP_AUTHORIZATION']}])]
+        auth = ('user', 'p' * 100)
+        client = base.Client('wsgi.local', auth=auth,
+                             transport=transport.WSGITransport(app))
+        header = client.users._request().json()[0]['auth']
+        assert header == 'Basic ' + base64.b64encode(':'.join(auth))
@@ -0,0 +1,131 @@
+import base64
+import json
+import urlparse
+from StringIO import StringIO
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class Transport(object):
+    """
+    Transport base class. Client delegates sending of
+    already built requests to transport object.
+
+    Inheritors should implement request method, that returns
+    response-like object with status_code, headers, text and json().
+    """
+
+    def request(self, method, url, auth=None, headers=None, data=None,
+                timeout=None):
+        """
+        @param method: http method
+        @param url: full url with query
+        @param auth: username/password tuple
+        @param headers: dict of headers
+        @param data: json dumped body
+        @param timeout: seconds or (connect, read) tuple
+        @return response
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+    Default transport, sends requests with requests lib.
+    @param session: optional requests.Session to keep connections alive.
+    Session also keeps cookies between requests and is shared by all
+    threads, that use the client.
+    """
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def request(self, method, url, auth=None, headers=None, data=None,
+                timeout=None):
+        sender = self.session or requests
+        return sender.request(method,
+                              url,
+                              auth=auth,
+                              headers=headers,
+                              data=data,
+                              timeout=timeout)
+
+    def close(self):
+        if self.session:
+            self.session.close()
+
+
+class WSGIResponse(object):
+    """
+    Minimal response object for WSGITransport
+    """
+
+    def __init__(self, status, headers, content):
+        self.status_code = int(status.split(' ', 1)[0])
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.text = content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class WSGITransport(Transport):
+    """
+    In-process transport, calls local WSGI application directly
+    without opening sockets.
+    @param app: WSGI application callable
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _environ(self, method, url, auth, headers, data):
+        parsed = urlparse.urlsplit(url)
+        body = data or ''
+        environ = {
+            'REQUEST_METHOD': method.upper(),
+            'SCRIPT_NAME': '',
+            'PATH_INFO': urlparse.unquote(parsed.path),
+            'QUERY_STRING': parsed.query,
+            'SERVER_NAME': parsed.hostname or 'localhost',
+            'SERVER_PORT': str(parsed.port or 80),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': parsed.scheme or 'http',
+            'wsgi.input': StringIO(body),
+            'wsgi.errors': StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if auth:
+            environ['HTTP_AUTHORIZATION'] = \
+                'Basic ' + base64.b64encode(':'.join(auth))
+        for k, v in (headers or {}).iteritems():
+            key = k.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            environ[key] = v
+        return environ
+
+    def request(self, method, url, auth=None, headers=None, data=None,
+                timeout=None):
+        status_headers = []
+
+        def start_response(status, headers, exc_info=None):
+            status_headers[:] = [status, headers]
+
+        result = self.app(self._environ(method, url, auth, headers, data),
+                          start_response)
+        try:
+            content = ''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return WSGIResponse(status_headers[0], status_headers[1], content)